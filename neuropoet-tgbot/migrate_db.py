@@ -37,6 +37,41 @@ def migrate_database():
         # Добавляем колонку user_settings в таблицу users, если её нет
         """
         ALTER TABLE users ADD COLUMN user_settings JSON DEFAULT '{"preferred_model": "deepseek"}';
+        """,
+
+        # Добавляем колонку top_emotion в таблицу generations, если её нет
+        """
+        ALTER TABLE generations ADD COLUMN top_emotion VARCHAR;
+        """,
+
+        # Заполняем top_emotion для старых генераций
+        """
+        UPDATE generations SET top_emotion = (
+            SELECT key FROM json_each(generations.emotions) ORDER BY value DESC LIMIT 1
+        ) WHERE top_emotion IS NULL;
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_generations_top_emotion ON generations (top_emotion);
+        """,
+
+        # Индексы для постраничного вывода истории
+        """
+        CREATE INDEX IF NOT EXISTS ix_emotion_analyses_user_time ON emotion_analyses (user_id, performed_at);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_generations_user_time ON generations (user_id, performed_at);
+        """,
+
+        # Индексы для проверки и подсчёта оценок
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_generation_ratings_rater_generation
+        ON generation_ratings (rater_id, generation_id);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_generation_ratings_generation ON generation_ratings (generation_id);
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS ix_emotion_ratings_user_analysis ON emotion_ratings (user_id, emotion_analysis_id);
         """
     ]
     
@@ -56,34 +91,9 @@ def migrate():
     # Создаем движок базы данных
     engine = create_engine("sqlite:///neuropoet.db")
 
-    # Создаем все таблицы
+    # Создаем все таблицы по моделям из src.database.database (включая emotion_ratings)
     Base.metadata.create_all(engine)
 
-    # Проверяем существование таблицы emotion_ratings
-    with engine.connect() as conn:
-        result = conn.execute(text("""
-            SELECT name FROM sqlite_master 
-            WHERE type='table' AND name='emotion_ratings'
-        """))
-        if not result.fetchone():
-            print("Создаем таблицу emotion_ratings...")
-            conn.execute(text("""
-                CREATE TABLE emotion_ratings (
-                    id INTEGER PRIMARY KEY,
-                    user_id INTEGER NOT NULL,
-                    emotion_analysis_id INTEGER NOT NULL,
-                    is_correct BOOLEAN NOT NULL,
-                    correct_emotion VARCHAR,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (user_id),
-                    FOREIGN KEY (emotion_analysis_id) REFERENCES emotion_analyses (id)
-                )
-            """))
-            conn.commit()
-            print("Таблица emotion_ratings создана успешно!")
-        else:
-            print("Таблица emotion_ratings уже существует.")
-
 if __name__ == "__main__":
     migrate_database()
     migrate() 
\ No newline at end of file
@@ -1,7 +1,7 @@
 import asyncio
-import json
 import logging
-from typing import Callable
+from functools import lru_cache
+from typing import Callable, Coroutine
 from pathlib import Path
 
 from aiogram import Router, types, Bot, F
@@ -11,14 +11,16 @@ from aiogram.types import ReactionTypeEmoji, InlineKeyboardMarkup, InlineKeyboar
     BufferedInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from .database.database import GenerationModel, get_default_user_settings, EmotionRating, EmotionAnalysis
-from .util.emotion import translate_emotion, top_emotions_translated
+from .database.database import GenerationModel, get_default_user_settings
+from .util.emotion import translate_emotion, top_emotions_translated, top_emotion
 from .api.emotion_api import EmotionAnalyzeRequestDto
 from .api.poetry_api import PoetryGenerationRequestDto
 from .util.emoji import Emoji
 from .util.markdown import escape_markdown
+from .util.serialization import dumps_pretty
+from .util.pagination import encode_history_cursor, decode_history_cursor
 from .util.telegram.restrictions import owner_only_command, get_owner_ids
-from .util.text import truncate_text
+from .util.text import truncate_text, get_command_args
 from .globals import get_global_state as gs
 
 ABOUT_FILE = Path(__file__).parent.parent / "res" / "about.md"
@@ -28,15 +30,60 @@ additional_command_list = {
     'export_feedback': 'Экспортирует отзывы о боте в JSON',
 }
 
+HEALTH_SERVICE_ORDER = ('emotion', 'poetry', 'database')
+# Every status line /health can show, so re-rendering is just lookups and a join
+HEALTH_STATUS_LINES = {
+    name: {
+        "checking": f"{Emoji.HOURGLASS.emoji} {name.capitalize()}: Проверяется...",
+        "success": f"{Emoji.CHECK_MARK.emoji} {name.capitalize()}: Работает",
+        "error": f"{Emoji.CROSSOUT.emoji} {name.capitalize()}: Ошибка",
+    }
+    for name in HEALTH_SERVICE_ORDER
+}
+
 router = Router()
 bot: Bot = None
 
+# Strong references keep fire-and-forget tasks alive until they are done
+_background_tasks: set[asyncio.Task] = set()
+# Users whose /generate is still running
+_generations_in_flight: set[int] = set()
+
 
 def set_bot(new_bot: Bot):
     global bot
     bot = new_bot
 
 
+@lru_cache(maxsize=1)
+def get_owners_string() -> str:
+    """Owner IDs formatted for MarkdownV2, built once since the owners don't change at runtime"""
+    return "\\[" + ", ".join(f"`{owner_id}`" for owner_id in sorted(get_owner_ids())) + "\\]"
+
+
+def refresh_owners_cache():
+    """
+    Drops cached owner data, call it after NPB_OWNER_USER_IDS has changed.
+    Owner-only commands keep the ids they captured on their first call until restart.
+    """
+    get_owner_ids.cache_clear()
+    get_owners_string.cache_clear()
+
+
+def _log_background_task_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logging.error(f"Background task failed: {task.exception()}", exc_info=task.exception())
+
+
+def run_in_background(coro: Coroutine) -> asyncio.Task:
+    """Schedules a coroutine whose result nobody waits for, e.g. a log write"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    task.add_done_callback(_log_background_task_error)
+    return task
+
+
 async def owner_only_permission_denied(message: types.Message):
     await message.reply("Эта команда доступна только владельцам бота.")
 
@@ -44,7 +91,7 @@ async def owner_only_permission_denied(message: types.Message):
 @router.message(Command("start"))
 async def cmd_start(message: types.Message):
     database = await gs().get_database()
-    database.add_user(user_id=message.from_user.id)
+    await database.add_user(user_id=message.from_user.id)
     description = await bot.get_my_description()
 
     start_text = (
@@ -96,8 +143,7 @@ async def cmd_about(message: types.Message):
 async def cmd_emotions(message: types.Message):
     try:
         # Extract command text
-        command, *args = message.text.split(maxsplit=1)
-        text = args[0] if args else ""
+        text = get_command_args(message.text)
 
         if not text:
             await message.reply("❌ Напишите текст после команды: /emotions <текст>")
@@ -118,16 +164,14 @@ async def cmd_emotions(message: types.Message):
 
         if response:
             database = await gs().get_database()
-            emotion_analysis = database.log_emotion_analysis(
+            emotion_analysis = await database.log_emotion_analysis(
                 user_id=message.from_user.id,
                 emotions=response.emotions,
                 request_text=text
             )
 
-            top_emotion = max(
-                response.emotions.keys(),
-                key=lambda x: response.emotions.get(x, 0.0)
-            ) or "no_emotion"
+            top_emotion_entry = top_emotion(response.emotions)
+            top_emotion_name = top_emotion_entry[0] if top_emotion_entry else "no_emotion"
             emojis: dict[str, Emoji] = {
                 "joy": Emoji.BIG_SMILE,
                 "sad": Emoji.TEAR,
@@ -139,7 +183,7 @@ async def cmd_emotions(message: types.Message):
                 "neutral": Emoji.NEUTRAL,
                 "no_emotion": Emoji.NEUTRAL,
             }
-            top_emoji = emojis.get(top_emotion, Emoji.NEUTRAL).emoji
+            top_emoji = emojis.get(top_emotion_name, Emoji.NEUTRAL).emoji
 
             emotions_translated = top_emotions_translated(response.emotions)
             
@@ -189,10 +233,16 @@ async def cmd_emotions(message: types.Message):
 
 @router.message(Command("generate"))
 async def cmd_generate(message: types.Message):
+    user_id = message.from_user.id
+    # Не запускаем вторую дорогую генерацию, пока первая ещё не завершилась
+    if user_id in _generations_in_flight:
+        await message.reply("⏳ Стихотворение уже генерируется, дождитесь ответа")
+        return
+
+    _generations_in_flight.add(user_id)
     try:
         # Extract command text
-        command, *args = message.text.split(maxsplit=1)
-        text = args[0] if args else ""
+        text = get_command_args(message.text)
 
         if not text:
             await message.reply("❌ Напишите текст после команды: /generate <текст>")
@@ -217,7 +267,12 @@ async def cmd_generate(message: types.Message):
             return
 
         emotions = emotion_response.emotions
-        database.log_emotion_analysis(user_id=message.from_user.id, emotions=emotions, request_text=text)
+        # Результат записи не нужен для ответа, поэтому не ждём её
+        run_in_background(database.log_emotion_analysis(
+            user_id=message.from_user.id,
+            emotions=emotions,
+            request_text=text
+        ))
         top_emotions = ", ".join(top_emotions_translated(emotions, limit=3))
 
         await reply_message.edit_text(
@@ -226,7 +281,9 @@ async def cmd_generate(message: types.Message):
             "⌛ Выполняется генерация стихотворения",
             parse_mode="MarkdownV2"
         )
-        user_settings = database.get_user_data(message.from_user.id).user_settings
+        # The user may not be stored yet: their first write above is still in flight
+        user = await database.get_user_data(message.from_user.id)
+        user_settings = (user.user_settings if user else None) or {}
 
         poetry_request = PoetryGenerationRequestDto(
             user_id=message.from_user.id,
@@ -241,7 +298,7 @@ async def cmd_generate(message: types.Message):
 
         poem = poetry_response.poem
 
-        generation_record = database.log_generation(
+        generation_record = await database.log_generation(
             user_id=message.from_user.id,
             request_text=text,
             emotions=emotions,
@@ -286,26 +343,40 @@ async def cmd_generate(message: types.Message):
     except Exception as e:
         logging.error(f"Poem generation error: {str(e)}", exc_info=True)
         await message.reply("❌ Ошибка генерации стихотворения")
+    finally:
+        _generations_in_flight.discard(user_id)
 
 
 @router.message(Command("history"))
 async def cmd_history(message: types.Message):
     try:
         user_id = message.from_user.id
-        args = message.text.split()[1:]  # Получаем аргументы команды
+        limit_arg, _, cursor = get_command_args(message.text).partition(' ')  # Получаем аргументы команды
 
         # Парсим лимит записей
         limit = 5  # Значение по умолчанию
-        if args and args[0].isdigit():
-            limit = min(int(args[0]), 20)  # Максимум 20 записей
+        if limit_arg.isdigit():
+            limit = min(int(limit_arg), 20)  # Максимум 20 записей
+
+        # Курсор следующей страницы (передаётся кнопкой "Показать ещё")
+        cursor = cursor.strip()
+        before_emotions, before_generations = None, None
+        if cursor:
+            before_emotions, before_generations = decode_history_cursor(cursor)
 
         # Получаем историю из базы данных
-        history = (await gs().get_database()).get_user_history(user_id=user_id, limit=limit)
+        database = await gs().get_database()
+        history = await database.get_user_history(
+            user_id=user_id,
+            limit=limit,
+            before_emotions=before_emotions,
+            before_generations=before_generations
+        )
 
         # Форматируем сообщение
         response = []
         if not history['emotions'] and not history['generations']:
-            await message.answer("📭 Ваша история пуста")
+            await message.answer("📭 Больше записей нет" if cursor else "📭 Ваша история пуста")
             return
 
         # Форматируем эмоции
@@ -332,10 +403,22 @@ async def cmd_history(message: types.Message):
                     )}"
                 )
 
+        # Неполная страница означает, что записи этого типа закончились
+        next_emotions = history['emotions'][-1].performed_at if len(history['emotions']) == limit else None
+        next_generations = history['generations'][-1].performed_at if len(history['generations']) == limit else None
+
+        reply_markup = None
+        if next_emotions or next_generations:
+            cursor = encode_history_cursor(next_emotions, next_generations)
+            reply_markup = InlineKeyboardMarkup(inline_keyboard=[[
+                InlineKeyboardButton(text="⬇️ Показать ещё", callback_data=f"history:{limit}:{cursor}")
+            ]])
+
         # Отправляем сообщение
         await message.reply(
             text="\n".join(response),
-            parse_mode="MarkdownV2"
+            parse_mode="MarkdownV2",
+            reply_markup=reply_markup
         )
 
     except Exception as e:
@@ -347,19 +430,18 @@ async def cmd_stats(message: types.Message):
     try:
         # Получаем данные
         db = await gs().get_database()
-        user_data = db.get_user_data(message.from_user.id)
+        user_data, emotion_history = await db.get_user_stats_data(message.from_user.id)
 
         # Форматируем дату регистрации
         join_date = user_data.registered_at.strftime("%d.%m.%Y %H:%M") if user_data else "неизвестно"
 
-        # Получаем и агрегируем эмоции
+        # Агрегируем эмоции
         emotions = {}
-        history = db.get_user_history(message.from_user.id)
 
-        if history['emotions']:
+        if emotion_history:
             # Собираем средние значения
             counter = {}
-            for record in history['emotions']:
+            for record in emotion_history:
                 for emotion, score in record.emotions.items():
                     emotions[emotion] = emotions.get(emotion, 0) + score
                     counter[emotion] = counter.get(emotion, 0) + 1
@@ -369,11 +451,12 @@ async def cmd_stats(message: types.Message):
                 emo: total / counter[emo]
                 for emo, total in emotions.items()
             }
+            # Экранируем только сами записи, а не весь собранный текст
             emotions_text = "\n".join(
-                f"• {entry}" for entry in top_emotions_translated(emotions_avg)
+                f"• {escape_markdown(entry)}" for entry in top_emotions_translated(emotions_avg)
             )
         else:
-            emotions_text = "Нет данных об эмоциях"
+            emotions_text = "Нет данных об эмоциях"  # Спецсимволов MarkdownV2 нет
 
         # Формируем ответ
         response = (
@@ -381,7 +464,7 @@ async def cmd_stats(message: types.Message):
             f"\\(aka @{escape_markdown(message.from_user.username)}, `{message.from_user.id}`\\)\n"
             f"📊 *Ваша статистика*\n\n"
             f"🕐 Дата регистрации: {escape_markdown(join_date)}\n"
-            f"📈 Средние эмоции:\n{escape_markdown(emotions_text)}"
+            f"📈 Средние эмоции:\n{emotions_text}"
         )
 
         await message.reply(
@@ -399,7 +482,7 @@ async def cmd_stats(message: types.Message):
 async def cmd_random_poem(message: types.Message):
     try:
         database = await gs().get_database()
-        poem = database.get_random_poem_fast()
+        poem = await database.get_random_poem_fast()
 
         if poem is None:
             await message.reply("❌ Не найдено ни одного стихотворения")
@@ -409,10 +492,9 @@ async def cmd_random_poem(message: types.Message):
         user_id = message.from_user.id
 
         # Check explicitly if user has rated the poem
-        user_already_rated = database.has_user_rated(user_id, generation_id)
+        user_already_rated = await database.has_user_rated(user_id, generation_id)
 
-        # Get explicit average rating
-        avg_rating = poem.average_rating()
+        avg_rating = poem.avg_rating
         avg_rating_text = f"📈 Средняя оценка: ⭐ {avg_rating:.1f}\n" if avg_rating else ""
 
         reply_markup = None
@@ -463,7 +545,7 @@ async def cmd_feedback(message: types.Message):
 @router.message(Command("settings"))
 async def cmd_settings(message: types.Message):
     database = await gs().get_database()
-    user = database.get_user_data(message.from_user.id)
+    user = await database.get_user_data(message.from_user.id)
 
     current_settings = get_default_user_settings()
     current_settings.update(user.user_settings or {})
@@ -478,25 +560,16 @@ async def cmd_settings(message: types.Message):
 @router.message(Command("health"))
 async def cmd_health(message: types.Message):
     sent_reply = await message.reply("🩺 Проверка статуса сервисов...")
-    service_order = ['emotion', 'poetry', 'database']
-    status = {name: "checking" for name in service_order}  # checking/success/error
+    status = {name: "checking" for name in HEALTH_SERVICE_ORDER}  # checking/success/error
 
     try:
         await message.react(reaction=[ReactionTypeEmoji(emoji=Emoji.THINK.emoji)])
 
         async def update_message():
             """Обновляем сообщение с текущими статусами"""
-            lines = []
-            for name in service_order:
-                if status[name] == "checking":
-                    line = f"{Emoji.HOURGLASS.emoji} {name.capitalize()}: Проверяется..."
-                elif status[name] == "success":
-                    line = f"{Emoji.CHECK_MARK.emoji} {name.capitalize()}: Работает"
-                else:
-                    line = f"{Emoji.CROSSOUT.emoji} {name.capitalize()}: Ошибка"
-                lines.append(line)
-
-            await sent_reply.edit_text("\n".join(lines))
+            await sent_reply.edit_text("\n".join(
+                HEALTH_STATUS_LINES[name][status[name]] for name in HEALTH_SERVICE_ORDER
+            ))
 
         # Первоначальное сообщение с индикаторами прогресса
         await update_message()
@@ -539,13 +612,9 @@ async def cmd_health(message: types.Message):
 @router.message(Command("owners"))
 @owner_only_command(default_action=owner_only_permission_denied)
 async def cmd_owners(message: types.Message):
-    owners_string = ("\\[" +
-                     ", ".join([f"`{owner_id}`" for owner_id in get_owner_ids()]) +
-                     "\\]")
-
     await message.reply(
         text=
-            f"Владельцы бота: {owners_string}\n" +
+            f"Владельцы бота: {get_owners_string()}\n" +
             f"Вы `{message.from_user.id}`",
         parse_mode='MarkdownV2'
     )
@@ -555,8 +624,10 @@ async def cmd_owners(message: types.Message):
 @owner_only_command(default_action=owner_only_permission_denied)
 async def cmd_get_feedback(message: types.Message):
     database = await gs().get_database()
-    summary = database.get_feedback_summary()
-    emotion_stats = database.get_emotion_rating_stats()
+    summary, emotion_stats = await asyncio.gather(
+        database.get_feedback_summary(),
+        database.get_emotion_rating_stats()
+    )
 
     def format_feedback(title, feedback):
         if feedback:
@@ -565,7 +636,7 @@ async def cmd_get_feedback(message: types.Message):
                 f"🔹 *{title}*\n"
                 f"Рейтинг: ⭐{feedback['rating']}\n"
                 f"Комментарий: _{escape_markdown(msg)}_\n"
-                f"Дата: {escape_markdown(feedback['created_at'])}\n"
+                f"Дата: {escape_markdown(feedback['created_at'].isoformat())}\n"
             )
         else:
             return f"🔹 *{title}*: Нет данных\n"
@@ -600,32 +671,28 @@ async def cmd_export_feedback(message: types.Message):
     database = await gs().get_database()
 
     # Получаем все записи оценок эмоций
-    with database.Session() as session:
-        ratings = session.query(EmotionRating).all()
-        
-        # Формируем данные для экспорта эмоций
-        emotion_data = []
-        for rating in ratings:
-            analysis = session.query(EmotionAnalysis).get(rating.emotion_analysis_id)
-            if analysis:
-                predicted_emotion = max(analysis.emotions.items(), key=lambda x: x[1])[0]
-                emotion_data.append({
-                    "text": analysis.request_text,
-                    "predicted_emotion": predicted_emotion,
-                    "correct_emotion": rating.correct_emotion if not rating.is_correct else predicted_emotion,
-                    "is_correct": rating.is_correct,
-                    "created_at": rating.created_at.isoformat()
-                })
+    rated_analyses = await database.get_rated_emotion_analyses()
+
+    # Формируем данные для экспорта эмоций
+    emotion_data = []
+    for rating, analysis in rated_analyses:
+        predicted_emotion, _ = top_emotion(analysis.emotions)
+        emotion_data.append({
+            "text": analysis.request_text,
+            "predicted_emotion": predicted_emotion,
+            "correct_emotion": rating.correct_emotion if not rating.is_correct else predicted_emotion,
+            "is_correct": rating.is_correct,
+            "created_at": rating.created_at
+        })
 
     # Получаем данные отзывов
-    feedback_json = database.export_bot_feedback_json()
-    feedback_data = json.loads(feedback_json)
+    feedback_data = await database.get_bot_feedback_export()
 
     # Добавляем данные эмоций в общий JSON
     feedback_data["emotions"] = emotion_data
 
     # Создаем финальный JSON
-    final_json = json.dumps(feedback_data, ensure_ascii=False, indent=2)
+    final_json = dumps_pretty(feedback_data)
     feedback_bytes = final_json.encode("utf-8")
     MAX_DISPLAY_LEN = 1024
 
@@ -692,13 +759,13 @@ async def handle_setting(callback: types.CallbackQuery):
     database = await gs().get_database()
 
     # Update the user's setting explicitly
-    database.update_user_settings(
+    await database.update_user_settings(
         user_id,
         {setting_name: setting_value}
     )
 
     # Get updated user settings to reflect correctly in the keyboard
-    user = database.get_user_data(user_id)
+    user = await database.get_user_data(user_id)
     current_settings = get_default_user_settings()
     current_settings.update(user.user_settings or {})
 
@@ -727,12 +794,12 @@ async def rating_handler(callback: CallbackQuery):
     user_id = callback.from_user.id
 
     # Check explicitly if user already rated
-    if database.has_user_rated(user_id, generation_id):
+    if await database.has_user_rated(user_id, generation_id):
         await callback.answer("❌ Вы уже оценили это стихотворение.", show_alert=True)
         return
 
     # Explicitly log the rating
-    database.rate_generation(user_id, generation_id, rating_value)
+    await database.rate_generation(user_id, generation_id, rating_value)
 
     # Remove inline keyboard explicitly after rating
     await callback.message.edit_reply_markup(reply_markup=None)
@@ -764,6 +831,21 @@ async def handle_command_buttons_for_start(callback: CallbackQuery):
     await callback.answer()
 
 
+@router.callback_query(lambda c: c.data.startswith('history:'))
+async def handle_history_page(callback: CallbackQuery):
+    _, limit, cursor = callback.data.split(":")
+
+    # Курсор хранится в самой кнопке, поэтому на сервере состояние не нужно
+    new_message = callback.message.model_copy(update={
+        "text": f"/history {limit} {cursor}",
+        "from_user": callback.from_user
+    })
+
+    await callback.message.edit_reply_markup(reply_markup=None)
+    await cmd_history(new_message)
+    await callback.answer()
+
+
 @router.callback_query(lambda c: c.data.startswith("feedback:"))
 async def handle_feedback_rating(callback: CallbackQuery):
     rating = int(callback.data.split(":")[1])
@@ -771,7 +853,7 @@ async def handle_feedback_rating(callback: CallbackQuery):
 
     # Log feedback explicitly now, with empty message:
     database = await gs().get_database()
-    database.log_bot_feedback(
+    await database.log_bot_feedback(
         user_id=callback.from_user.id,
         rating=rating,
         telegram_message_id=bot_msg_id,
@@ -790,7 +872,7 @@ async def handle_feedback_reply(message: types.Message):
     bot_msg_id = message.reply_to_message.message_id
 
     database = await gs().get_database()
-    updated = database.update_feedback_message(
+    updated = await database.update_feedback_message(
         telegram_message_id=bot_msg_id,
         new_message=message.text
     )
@@ -813,13 +895,13 @@ async def emotion_rating_handler(callback: CallbackQuery):
     user_id = callback.from_user.id
 
     # Проверяем, не оценивал ли пользователь уже этот анализ
-    if database.has_user_rated_emotion(user_id, analysis_id):
+    if await database.has_user_rated_emotion(user_id, analysis_id):
         await callback.answer("❌ Вы уже оценили этот анализ эмоций.", show_alert=True)
         return
 
     if rating == "correct":
         # Если оценка "правильно", сохраняем и удаляем кнопки
-        database.rate_emotion_analysis(
+        await database.rate_emotion_analysis(
             user_id=user_id,
             emotion_analysis_id=analysis_id,
             is_correct=True
@@ -853,7 +935,7 @@ async def emotion_correct_handler(callback: CallbackQuery):
     user_id = callback.from_user.id
 
     # Сохраняем правильную эмоцию
-    database.rate_emotion_analysis(
+    await database.rate_emotion_analysis(
         user_id=user_id,
         emotion_analysis_id=analysis_id,
         is_correct=False,
@@ -1,16 +1,34 @@
+import asyncio
+import copy
 import json
+import logging
 import random
+import time
 from collections import defaultdict
 from datetime import datetime
 from enum import Enum
+from itertools import islice
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, JSON, ForeignKey, text, func, cast, Boolean
-from sqlalchemy.ext.mutable import MutableDict
-from sqlalchemy.orm import declarative_base, relationship, sessionmaker, joinedload
-from typing import Optional, List, Dict
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, text, func, cast, Boolean, \
+    Index, UniqueConstraint, DDL, event, insert, select, or_, and_, exists
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import declarative_base, relationship, column_property, undefer
+from typing import Optional, List, Dict, Iterable, Any, Awaitable, Callable
+
+from ..util.emotion import top_emotion
+from ..util.serialization import dumps_pretty
 
 Base = declarative_base()
 
+POEM_IDS_REFRESH_INTERVAL = 5 * 60  # seconds
+AGGREGATES_CACHE_TTL = 60  # seconds
+EXPORT_BATCH_SIZE = 200  # rows fetched per round trip when streaming exports
+HEALTH_CHECK_TTL = 5  # seconds
+IMPORT_CHUNK_SIZE = 1000  # rows per multi-row INSERT when importing
+
+logger = logging.getLogger(__name__)
+
 
 class GenerationModel(Enum):
     RUGPT3 = 'ru_gpt3'
@@ -22,14 +40,14 @@ DEFAULT_USER_SETTINGS = {
 }
 
 def get_default_user_settings():
-    return json.loads(json.dumps(DEFAULT_USER_SETTINGS))
+    return copy.deepcopy(DEFAULT_USER_SETTINGS)
 
 class User(Base):
     __tablename__ = 'users'
 
     user_id = Column(Integer, primary_key=True)
     registered_at = Column(DateTime, default=datetime.now)
-    user_settings = Column(MutableDict.as_mutable(JSON), default=lambda: DEFAULT_USER_SETTINGS.copy())
+    user_settings = Column(JSON, default=lambda: DEFAULT_USER_SETTINGS.copy())
 
     # Relationships
     emotions = relationship("EmotionAnalysis", back_populates="user")
@@ -39,6 +57,10 @@ class User(Base):
 
 class EmotionAnalysis(Base):
     __tablename__ = 'emotion_analyses'
+    __table_args__ = (
+        # Serves history pages: filter by user, walk performed_at backwards
+        Index('ix_emotion_analyses_user_time', 'user_id', 'performed_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.user_id'))
@@ -53,6 +75,11 @@ class EmotionAnalysis(Base):
 
 class GenerationRating(Base):
     __tablename__ = 'generation_ratings'
+    __table_args__ = (
+        # One rating per user and generation; also serves has_user_rated lookups
+        UniqueConstraint('rater_id', 'generation_id', name='uq_generation_ratings_rater_generation'),
+        Index('ix_generation_ratings_generation', 'generation_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     rater_id = Column(Integer, ForeignKey('users.user_id'))
@@ -62,12 +89,16 @@ class GenerationRating(Base):
 
 class Generation(Base):
     __tablename__ = 'generations'
+    __table_args__ = (
+        Index('ix_generations_user_time', 'user_id', 'performed_at'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.user_id'))
     performed_at = Column(DateTime, default=datetime.now)
     request_text = Column(String)
     emotions = Column(JSON)
+    top_emotion = Column(String, index=True)  # Precomputed for rating stats
     response_text = Column(String)
     model = Column(String, nullable=False, default="ru_gpt3")
     rhyme_scheme = Column(String, default="Неизвестно")
@@ -77,10 +108,70 @@ class Generation(Base):
     user = relationship("User", back_populates="generations")
     ratings = relationship("GenerationRating", backref="generation")
 
-    def average_rating(self) -> Optional[float]:
-        if self.ratings and len(self.ratings) > 0:
-            return sum(r.rating for r in self.ratings) / len(self.ratings)
-        return None
+    # Computed by the database, load it with `.options(undefer(Generation.avg_rating))`
+    avg_rating = column_property(
+        select(func.avg(GenerationRating.rating))
+        .where(GenerationRating.generation_id == id)
+        .correlate_except(GenerationRating)
+        .scalar_subquery(),
+        deferred=True
+    )
+
+
+class GenerationRatingSummary(Base):
+    """
+    Number of ratings per generation attributes and rating value.
+    Filled by a trigger on generation_ratings, so rating stats don't scan the ratings table.
+    """
+    __tablename__ = 'generation_rating_summary'
+    __table_args__ = (
+        Index('ix_generation_rating_summary_key', 'model', 'rhyme_scheme', 'genre', 'top_emotion', 'rating'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    model = Column(String)
+    rhyme_scheme = Column(String)
+    genre = Column(String)
+    top_emotion = Column(String)
+    rating = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+
+# Attributes can be NULL, so rows are matched with IS instead of a unique constraint
+_SUMMARY_KEY_MATCHES = """
+    s.model IS g.model AND s.rhyme_scheme IS g.rhyme_scheme
+    AND s.genre IS g.genre AND s.top_emotion IS g.top_emotion
+"""
+
+event.listen(Base.metadata, "after_create", DDL(f"""
+CREATE TRIGGER IF NOT EXISTS trg_generation_ratings_summary
+AFTER INSERT ON generation_ratings
+BEGIN
+    UPDATE generation_rating_summary SET count = count + 1
+    WHERE id = (
+        SELECT s.id FROM generation_rating_summary s
+        JOIN generations g ON g.id = NEW.generation_id
+        WHERE {_SUMMARY_KEY_MATCHES} AND s.rating = NEW.rating
+    );
+    INSERT INTO generation_rating_summary (model, rhyme_scheme, genre, top_emotion, rating, count)
+    SELECT g.model, g.rhyme_scheme, g.genre, g.top_emotion, NEW.rating, 1
+    FROM generations g
+    WHERE g.id = NEW.generation_id AND NOT EXISTS (
+        SELECT 1 FROM generation_rating_summary s
+        WHERE {_SUMMARY_KEY_MATCHES} AND s.rating = NEW.rating
+    );
+END
+""").execute_if(dialect="sqlite"))
+
+# Ratings given before the summary table existed are counted once, when it is still empty
+event.listen(Base.metadata, "after_create", DDL("""
+INSERT INTO generation_rating_summary (model, rhyme_scheme, genre, top_emotion, rating, count)
+SELECT g.model, g.rhyme_scheme, g.genre, g.top_emotion, r.rating, COUNT(r.id)
+FROM generation_ratings r
+JOIN generations g ON g.id = r.generation_id
+WHERE NOT EXISTS (SELECT 1 FROM generation_rating_summary)
+GROUP BY g.model, g.rhyme_scheme, g.genre, g.top_emotion, r.rating
+""").execute_if(dialect="sqlite"))
 
 
 class BotFeedback(Base):
@@ -98,6 +189,9 @@ class BotFeedback(Base):
 
 class EmotionRating(Base):
     __tablename__ = 'emotion_ratings'
+    __table_args__ = (
+        Index('ix_emotion_ratings_user_analysis', 'user_id', 'emotion_analysis_id'),
+    )
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey('users.user_id'))
@@ -111,41 +205,118 @@ class EmotionRating(Base):
     emotion_analysis = relationship("EmotionAnalysis", back_populates="ratings")
 
 
-class Database:
-    def __init__(self, db_url: str = "sqlite:///neuropoet.db"):
-        self.engine = create_engine(db_url)
-        self.Session = sessionmaker(bind=self.engine)
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Tune every new SQLite connection: WAL journal lets readers run alongside the writer,
+    and synchronous=NORMAL skips the per-commit fsync, which is still safe in WAL mode.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-20000")  # ~20 MB
+    cursor.close()
 
-        # Create tables if they don't exist
-        Base.metadata.create_all(self.engine)
 
-    def add_user(self, user_id: int) -> None:
-        """Add new user if not exists"""
-        with self.Session() as session:
-            if not session.get(User, user_id):
-                session.add(User(user_id=user_id, registered_at=datetime.now()))
-                session.commit()
+def _chunks(rows: Iterable[Dict], size: int) -> Iterable[List[Dict]]:
+    iterator = iter(rows)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _top_emotion_name(emotions: Optional[Dict[str, float]]) -> Optional[str]:
+    top = top_emotion(emotions)
+    return top[0] if top else None
 
-    def log_emotion_analysis(
+
+class Database:
+    def __init__(self, db_url: str = "sqlite+aiosqlite:///neuropoet.db"):
+        # aiosqlite runs each connection in its own worker thread, so database I/O no longer blocks the event loop.
+        # File databases keep a pool of open connections (AsyncAdaptedQueuePool), so the pragmas run once per connection
+        # pool_pre_ping checks a pooled connection before handing it out, so broken connections are replaced
+        self.engine = create_async_engine(
+            db_url,
+            pool_pre_ping=True,
+            insertmanyvalues_page_size=IMPORT_CHUNK_SIZE,
+            connect_args={"check_same_thread": False}
+        )
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", _set_sqlite_pragmas)
+        self.Session = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        self._tables_created = False
+
+        # Last health check result and when it was taken
+        self._last_health: Optional[bool] = None
+        self._last_health_checked_at: float = 0.0
+
+        # Cached generation ids, so picking a random poem is a single primary key lookup
+        self._poem_ids: list[int] = []
+        self._poem_ids_loaded_at: Optional[float] = None
+
+        # Rating aggregates for stats commands: key -> (computed_at, value), cleared on rating writes
+        self._aggregates_cache: dict[str, tuple[float, Any]] = {}
+
+    async def create_tables(self) -> None:
+        """Create tables if they don't exist, once per engine"""
+        if self._tables_created:
+            return
+        async with self.engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        self._tables_created = True
+
+    async def _cached(
+            self,
+            key: str,
+            compute: Callable[[], Awaitable[Any]],
+            ttl: float = AGGREGATES_CACHE_TTL
+    ) -> Any:
+        """Return a cached aggregate younger than `ttl` seconds, computing it otherwise. Treat the value as read-only."""
+        now = time.monotonic()
+        cached = self._aggregates_cache.get(key)
+        if cached is not None and now - cached[0] < ttl:
+            return cached[1]
+
+        value = await compute()
+        self._aggregates_cache[key] = (now, value)
+        return value
+
+    async def add_user(self, user_id: int) -> None:
+        """Add new user if not exists"""
+        async with self.Session() as session:
+            await self._ensure_users(session, (user_id,))
+            await session.commit()
+
+    @staticmethod
+    async def _ensure_users(session: AsyncSession, user_ids: Iterable[int]) -> None:
+        """Add users that don't exist yet as part of the caller's transaction"""
+        registered_at = datetime.now()
+        await session.execute(
+            sqlite_insert(User).on_conflict_do_nothing(index_elements=['user_id']),
+            [{"user_id": user_id, "registered_at": registered_at} for user_id in set(user_ids)]
+        )
+
+    async def log_emotion_analysis(
             self,
             user_id: int,
             emotions: Dict[str, float],
             request_text: str
     ) -> EmotionAnalysis:
         """Log emotion analysis result and return the created object"""
-        with self.Session() as session:
-            self.add_user(user_id)  # Ensure user exists
+        async with self.Session() as session:
+            await self._ensure_users(session, (user_id,))  # Ensure user exists
             analysis = EmotionAnalysis(
                 user_id=user_id,
                 emotions=emotions,
                 request_text=request_text
             )
             session.add(analysis)
-            session.commit()
-            session.refresh(analysis)  # Refresh to get the generated ID
+            await session.commit()
+            await session.refresh(analysis)  # Refresh to get the generated ID
             return analysis
 
-    def log_generation(
+    async def log_generation(
             self,
             user_id: int,
             request_text: str,
@@ -156,169 +327,191 @@ class Database:
             genre: str,
     ) -> Generation:
         """Log poetry generation result and explicitly return the Generation object"""
-        with self.Session() as session:
-            self.add_user(user_id)  # Ensure user exists
+        async with self.Session() as session:
+            await self._ensure_users(session, (user_id,))  # Ensure user exists
 
             generation = Generation(
                 user_id=user_id,
                 request_text=request_text,
                 emotions=emotions,
+                top_emotion=_top_emotion_name(emotions),
                 response_text=response_text,
                 model=model,
                 rhyme_scheme=rhyme_scheme,
                 genre=genre,
             )
             session.add(generation)
-            session.commit()
+            await session.commit()
 
-            session.refresh(generation)  # Explicitly refresh object to get generated ID
+            await session.refresh(generation)  # Explicitly refresh object to get generated ID
+            if self._poem_ids_loaded_at is not None:
+                self._poem_ids.append(generation.id)
             return generation
 
-    def get_user_history(
+    async def bulk_log_generations(self, rows: List[Dict]) -> None:
+        """
+        Log many generations in one transaction.
+        Each row holds the same keys as the arguments of `log_generation`.
+        """
+        await self.import_generations(rows)
+
+    async def import_generations(self, rows: Iterable[Dict]) -> int:
+        """
+        Import generations, e.g. when restoring a backup, and return how many were imported.
+        Rows are consumed lazily and inserted in chunks of `IMPORT_CHUNK_SIZE`, all in one transaction.
+        Each row holds the same keys as the arguments of `log_generation`.
+        """
+        imported = 0
+        async with self.Session() as session:
+            for chunk in _chunks(rows, IMPORT_CHUNK_SIZE):
+                await self._ensure_users(session, (row["user_id"] for row in chunk))
+                await session.execute(
+                    insert(Generation),
+                    [{**row, "top_emotion": _top_emotion_name(row.get("emotions"))} for row in chunk]
+                )
+                imported += len(chunk)
+            await session.commit()
+
+        if imported:
+            self._poem_ids_loaded_at = None  # New ids are unknown, reload them on next use
+        return imported
+
+    async def get_user_history(
             self,
             user_id: int,
-            limit: int = 10
+            limit: int = 10,
+            before_emotions: Optional[datetime] = None,
+            before_generations: Optional[datetime] = None
     ) -> Dict[str, List]:
-        """Get user's interaction history"""
-        with self.Session() as session:
+        """
+        Get user's interaction history, newest first.
+        Pass `performed_at` of the last entries already shown as `before_*` to get the next page.
+        """
+        emotions_query = select(EmotionAnalysis).filter_by(user_id=user_id)
+        if before_emotions is not None:
+            emotions_query = emotions_query.where(EmotionAnalysis.performed_at < before_emotions)
+
+        generations_query = select(Generation).filter_by(user_id=user_id)
+        if before_generations is not None:
+            generations_query = generations_query.where(Generation.performed_at < before_generations)
+
+        async with self.Session() as session:
             return {
-                "emotions": session.query(EmotionAnalysis)
+                "emotions": list(await session.scalars(
+                    emotions_query
+                    .order_by(EmotionAnalysis.performed_at.desc())
+                    .limit(limit)
+                )),
+                "generations": list(await session.scalars(
+                    generations_query
+                    .order_by(Generation.performed_at.desc())
+                    .limit(limit)
+                ))
+            }
+
+    async def get_user_stats_data(
+            self,
+            user_id: int,
+            limit: int = 10
+    ) -> tuple[Optional[User], List[EmotionAnalysis]]:
+        """Get user and their latest emotion analyses in one go"""
+        async with self.Session() as session:
+            user = await session.get(User, user_id)
+            emotions = list(await session.scalars(
+                select(EmotionAnalysis)
                 .filter_by(user_id=user_id)
                 .order_by(EmotionAnalysis.performed_at.desc())
                 .limit(limit)
-                .all(),
-                "generations": session.query(Generation)
-                .filter_by(user_id=user_id)
-                .order_by(Generation.performed_at.desc())
-                .limit(limit)
-                .all()
-            }
+            ))
+            return user, emotions
 
-    def rate_generation(
+    async def rate_generation(
         self, rater_id: int, generation_id: int, rating: int
     ) -> None:
-        """Explicitly rate a generation"""
-        with self.Session() as session:
-            existing_rating = session.query(GenerationRating).filter_by(
-                rater_id=rater_id, generation_id=generation_id
-            ).first()
-            if existing_rating is None:
-                session.add(GenerationRating(
-                    rater_id=rater_id,
-                    generation_id=generation_id,
-                    rating=rating
-                ))
-                session.commit()
-
-    def has_user_rated(self, rater_id: int, generation_id: int) -> bool:
-        """Explicitly check if user already rated generation"""
-        with self.Session() as session:
-            return session.query(GenerationRating).filter_by(
-                rater_id=rater_id, generation_id=generation_id
-            ).first() is not None
-
-    def get_generation_rating_distribution(self) -> dict[int, int]:
-        """Get explicit distribution of generation ratings (1–5)."""
-        with self.Session() as session:
-            ratings_counts = session.query(
-                GenerationRating.rating,
-                func.count(GenerationRating.rating)
-            ).group_by(GenerationRating.rating).all()
-
-            # Explicitly ensure keys 1 through 5 are present, defaulting to 0
-            distribution = defaultdict(int, {rating: count for rating, count in ratings_counts})
-
-            return {rating: distribution[rating] for rating in range(1, 6)}
-
-    def get_generation_rating_distribution_by_model(self) -> dict[str, dict[int, int]]:
-        """
-        Get explicit distribution of generation ratings (1–5) grouped by generation model.
-        Example:
-            {
-                "deepseek": {1: 0, 2: 0, 3: 0, 4: 1, 5: 9},
-                "ru_gpt3": {1: 2, 2: 1, 3: 3, 4: 7, 5: 4}
-            }
-        """
-        with self.Session() as session:
-            ratings_data = session.query(
-                Generation.model,
-                GenerationRating.rating,
-                func.count(GenerationRating.rating)
-            ).join(
-                GenerationRating, Generation.id == GenerationRating.generation_id
-            ).group_by(
-                Generation.model,
-                GenerationRating.rating
-            ).all()
-
-            # Explicitly prepare nested dictionaries with default zeros
-            model_distribution = defaultdict(lambda: {rating: 0 for rating in range(1, 6)})
-
-            for model, rating, count in ratings_data:
-                model_distribution[model][rating] = count
-
-            return dict(model_distribution)
-
-    def get_user_data(self, user_id: int) -> User | None:
-        with (self.Session() as session):
-            return (
-                session.query(User)
-                .filter_by(user_id=user_id)
-                .first()
+        """Explicitly rate a generation, keeping the first rating if the user has already rated it"""
+        async with self.Session() as session:
+            await session.execute(
+                sqlite_insert(GenerationRating)
+                .values(rater_id=rater_id, generation_id=generation_id, rating=rating)
+                .on_conflict_do_nothing(index_elements=['rater_id', 'generation_id'])
             )
+            await session.commit()
 
-    def update_user_settings(self, user_id: int, new_settings: dict) -> bool:
-        """Explicitly update user settings JSON by user_id."""
-        with self.Session() as session:
-            user = session.query(User).filter_by(user_id=user_id).first()
+        self._aggregates_cache.clear()
 
-            if user:
-                if user.user_settings is None:
-                    user.user_settings = new_settings
-                else:
-                    user.user_settings.update(new_settings)
+    async def has_user_rated(self, rater_id: int, generation_id: int) -> bool:
+        """Explicitly check if user already rated generation"""
+        async with self.Session() as session:
+            return await session.scalar(select(exists().where(
+                GenerationRating.rater_id == rater_id,
+                GenerationRating.generation_id == generation_id
+            )))
 
-                session.commit()
-                return True
-            return False
+    async def get_user_data(self, user_id: int) -> User | None:
+        async with self.Session() as session:
+            return await session.get(User, user_id)
 
-    def get_all_poems(self, limit: int = 100) -> list[str]:
-        with self.Session() as session:
-            generations = (
-                session.query(Generation)
-                .limit(limit)
-                .all()
-            )
-            return [generation.response_text for generation in generations]
-
-    def get_random_poem_fast(self) -> Generation | None:
-        with self.Session() as session:
-            max_id = session.query(func.max(Generation.id)).scalar()
-            if not max_id:
-                return None
-
-            random_id = random.randint(1, max_id)
-
-            generation = (
-                session.query(Generation)
-                .options(joinedload(Generation.ratings))  # Explicitly eager load ratings
-                .filter(Generation.id >= random_id)
-                .order_by(Generation.id)
-                .limit(1)
-                .first()
+    async def update_user_settings(self, user_id: int, new_settings: dict) -> bool:
+        """Explicitly update user settings JSON by user_id."""
+        async with self.Session() as session:
+            # Merge the new keys in SQLite (JSON1), without reading the settings back
+            result = await session.execute(
+                text(
+                    "UPDATE users SET user_settings = json_patch(coalesce(user_settings, '{}'), :patch) "
+                    "WHERE user_id = :user_id"
+                ),
+                {"patch": json.dumps(new_settings), "user_id": user_id}
             )
+            await session.commit()
+            return result.rowcount > 0
+
+    async def get_all_poems(self, limit: int = 100) -> list[str]:
+        async with self.Session() as session:
+            return list(await session.scalars(
+                select(Generation.response_text)
+                .order_by(Generation.id.desc())
+                .limit(limit)
+            ))
 
+    async def _get_poem_ids(self) -> list[int]:
+        """Get cached generation ids, reloading them once they are older than the refresh interval"""
+        now = time.monotonic()
+        if self._poem_ids_loaded_at is None or now - self._poem_ids_loaded_at > POEM_IDS_REFRESH_INTERVAL:
+            async with self.Session() as session:
+                self._poem_ids = list(await session.scalars(select(Generation.id)))
+            self._poem_ids_loaded_at = now
+        return self._poem_ids
+
+    async def get_random_poem_fast(self) -> Generation | None:
+        poem_ids = await self._get_poem_ids()
+        if not poem_ids:
+            return None
+
+        async with self.Session() as session:
+            generation = await session.get(
+                Generation,
+                random.choice(poem_ids),
+                options=[undefer(Generation.avg_rating)]
+            )
+            if generation is None:
+                # The cached id is stale, sample the table directly instead
+                generation = await session.scalar(
+                    select(Generation)
+                    .options(undefer(Generation.avg_rating))
+                    .order_by(func.random())
+                    .limit(1)
+                )
             return generation
 
-    def log_bot_feedback(
+    async def log_bot_feedback(
             self,
             user_id: int,
             rating: int,
             telegram_message_id: int,
             message: Optional[str] = None
     ) -> None:
-        with self.Session() as session:
-            self.add_user(user_id)
+        async with self.Session() as session:
+            await self._ensure_users(session, (user_id,))
             feedback = BotFeedback(
                 user_id=user_id,
                 rating=rating,
@@ -326,167 +519,249 @@ class Database:
                 message=message
             )
             session.add(feedback)
-            session.commit()
+            await session.commit()
 
-    def update_feedback_message(
+    async def bulk_log_bot_feedback(self, rows: List[Dict]) -> None:
+        """
+        Log many bot feedback entries in one transaction.
+        Each row holds the same keys as the arguments of `log_bot_feedback`.
+        """
+        if not rows:
+            return
+
+        async with self.Session() as session:
+            await self._ensure_users(session, (row["user_id"] for row in rows))
+            await session.execute(insert(BotFeedback), rows)
+            await session.commit()
+
+    async def update_feedback_message(
             self,
             telegram_message_id: int,
             new_message: str
     ) -> bool:
         """Explicitly updates feedback message using telegram_message_id."""
-        with self.Session() as session:
-            feedback = session.query(BotFeedback).filter_by(
-                telegram_message_id=telegram_message_id
-            ).first()
+        async with self.Session() as session:
+            feedback = await session.scalar(
+                select(BotFeedback).filter_by(telegram_message_id=telegram_message_id)
+            )
 
             if feedback:
                 feedback.message = new_message
-                session.commit()
+                await session.commit()
                 return True
             return False
 
-    def get_average_ratings_by_model(self) -> dict[str, float]:
-        """Explicitly calculate average ratings grouped by model."""
-        with self.Session() as session:
-            results = session.query(
-                Generation.model,
-                func.avg(GenerationRating.rating).label('average_rating'),
-                func.count(GenerationRating.id).label('num_ratings')
-            ).join(
-                GenerationRating, Generation.id == GenerationRating.generation_id
-            ).group_by(
-                Generation.model
-            ).all()
-
-            return {
-                model: round(avg_rating, 2)
-                for model, avg_rating, count in results
-                if count > 0
-            }
-
-    def get_ratings_by_top_emotion(self) -> dict[str, dict[str, float]]:
-        """Explicitly compute average ratings grouped by the top emotion."""
-        with self.Session() as session:
-            query_results = session.query(
-                Generation.emotions,
-                GenerationRating.rating
-            ).join(
-                GenerationRating, Generation.id == GenerationRating.generation_id
-            ).all()
-
-            emotion_stats = defaultdict(list)
-
-            for emotions, rating in query_results:
-                if emotions:
-                    top_emotion = max(emotions.items(), key=lambda x: x[1])[0]
-                    emotion_stats[top_emotion].append(rating)
-
-            return {
-                emotion: {
-                    "avg_rating": round(sum(ratings) / len(ratings), 2),
-                    "count": len(ratings)
-                }
-                for emotion, ratings in emotion_stats.items()
-            }
-
-    def get_ratings_by_rhyme_scheme(self) -> dict[str, dict[str, float]]:
-        """Calculate average ratings explicitly by rhyme scheme."""
-        with self.Session() as session:
-            rhyme_scheme_results = session.query(
-                Generation.rhyme_scheme,
-                func.avg(GenerationRating.rating),
-                func.count(GenerationRating.id)
-            ).join(
-                GenerationRating, Generation.id == GenerationRating.generation_id
-            ).group_by(Generation.rhyme_scheme).all()
+    async def _get_rating_stats(self) -> dict:
+        return await self._cached("rating_stats", self._compute_rating_stats)
 
+    async def _compute_rating_stats(self) -> dict:
+        """
+        Compute every generation rating aggregate from the trigger-maintained summary table.
+        SQLite has no GROUPING SETS, so the counts per combination of all dimensions
+        are rolled up into the separate groupings here.
+        """
+        summary = GenerationRatingSummary
+        async with self.Session() as session:
+            rows = (await session.execute(
+                select(
+                    summary.model,
+                    summary.rhyme_scheme,
+                    summary.genre,
+                    summary.top_emotion,
+                    summary.rating,
+                    func.sum(summary.count)
+                ).group_by(
+                    summary.model,
+                    summary.rhyme_scheme,
+                    summary.genre,
+                    summary.top_emotion,
+                    summary.rating
+                )
+            )).all()
+
+        distribution = {rating: 0 for rating in range(1, 6)}
+        distribution_by_model = defaultdict(lambda: {rating: 0 for rating in range(1, 6)})
+        # [sum of ratings, number of ratings] for every value of every dimension
+        totals = {
+            dimension: defaultdict(lambda: [0, 0])
+            for dimension in ("model", "rhyme_scheme", "genre", "top_emotion")
+        }
+
+        for model, rhyme_scheme, genre, emotion, rating, count in rows:
+            if rating in distribution:
+                distribution[rating] += count
+            distribution_by_model[model][rating] = distribution_by_model[model].get(rating, 0) + count
+
+            for dimension, value in (
+                    ("model", model),
+                    ("rhyme_scheme", rhyme_scheme),
+                    ("genre", genre),
+                    ("top_emotion", emotion),
+            ):
+                total = totals[dimension][value]
+                total[0] += rating * count
+                total[1] += count
+
+        def averages(dimension: str) -> dict[str, dict[str, float]]:
             return {
-                scheme: {
-                    "avg_rating": round(avg, 2),
+                value: {
+                    "avg_rating": round(rating_sum / count, 2),
                     "count": count
                 }
-                for scheme, avg, count in rhyme_scheme_results
+                for value, (rating_sum, count) in totals[dimension].items()
             }
 
-    def get_ratings_by_genre(self) -> dict[str, dict[str, float]]:
-        """Calculate average ratings explicitly by genre."""
-        with self.Session() as session:
-            genre_results = session.query(
-                Generation.genre,
-                func.avg(GenerationRating.rating),
-                func.count(GenerationRating.id)
-            ).join(
-                GenerationRating, Generation.id == GenerationRating.generation_id
-            ).group_by(Generation.genre).all()
+        return {
+            "rating_distribution": distribution,
+            "rating_distribution_by_model": dict(distribution_by_model),
+            "avg_rating_by_model": {
+                model: round(rating_sum / count, 2)
+                for model, (rating_sum, count) in totals["model"].items()
+            },
+            "ratings_by_top_emotion": {
+                emotion: stats
+                for emotion, stats in averages("top_emotion").items()
+                if emotion is not None
+            },
+            "ratings_by_rhyme_scheme": averages("rhyme_scheme"),
+            "ratings_by_genre": averages("genre"),
+        }
+
+    async def get_generation_rating_distribution(self) -> dict[int, int]:
+        """Get explicit distribution of generation ratings (1–5)."""
+        return (await self._get_rating_stats())["rating_distribution"]
 
-            return {
-                genre: {
-                    "avg_rating": round(avg, 2),
-                    "count": count
-                }
-                for genre, avg, count in genre_results
+    async def get_generation_rating_distribution_by_model(self) -> dict[str, dict[int, int]]:
+        """
+        Get explicit distribution of generation ratings (1–5) grouped by generation model.
+        Example:
+            {
+                "deepseek": {1: 0, 2: 0, 3: 0, 4: 1, 5: 9},
+                "ru_gpt3": {1: 2, 2: 1, 3: 3, 4: 7, 5: 4}
             }
+        """
+        return (await self._get_rating_stats())["rating_distribution_by_model"]
 
-    def get_feedback_summary(self) -> dict[str, Optional[dict]]:
-        with self.Session() as session:
-            avg_rating = session.query(func.avg(BotFeedback.rating)).scalar()
-            avg_generation_rating = session.query(func.avg(GenerationRating.rating)).scalar()
-            avg_generation_rating_by_model = self.get_average_ratings_by_model()
-
-            best_feedback = session.query(BotFeedback) \
-                .order_by(BotFeedback.rating.desc(), BotFeedback.created_at.asc()) \
-                .first()
-
-            worst_feedback = session.query(BotFeedback) \
-                .order_by(BotFeedback.rating.asc(), BotFeedback.created_at.asc()) \
-                .first()
-
-            newest_feedback = session.query(BotFeedback) \
-                .order_by(BotFeedback.created_at.desc()) \
-                .first()
+    async def get_average_ratings_by_model(self) -> dict[str, float]:
+        """Explicitly calculate average ratings grouped by model."""
+        return (await self._get_rating_stats())["avg_rating_by_model"]
 
-            longest_feedback = session.query(BotFeedback) \
-                .filter(BotFeedback.message.isnot(None)) \
-                .order_by(func.length(BotFeedback.message).desc()) \
-                .first()
+    async def get_ratings_by_top_emotion(self) -> dict[str, dict[str, float]]:
+        """Explicitly compute average ratings grouped by the top emotion."""
+        return (await self._get_rating_stats())["ratings_by_top_emotion"]
 
-            def serialize_feedback(fb: Optional[BotFeedback]) -> Optional[dict]:
-                if fb:
-                    return {
-                        "user_id": fb.user_id,
-                        "rating": fb.rating,
-                        "message": fb.message,
-                        "created_at": fb.created_at.isoformat()
-                    }
-                return None
+    async def get_ratings_by_rhyme_scheme(self) -> dict[str, dict[str, float]]:
+        """Calculate average ratings explicitly by rhyme scheme."""
+        return (await self._get_rating_stats())["ratings_by_rhyme_scheme"]
 
-            return {
-                "average_rating": round(avg_rating, 2) if avg_rating else None,
-                "avg_gen_rating":
-                    round(avg_generation_rating, 2) if avg_generation_rating else None,
-                "avg_gen_rating_by_model": avg_generation_rating_by_model,
-                "best_feedback": serialize_feedback(best_feedback),
-                "worst_feedback": serialize_feedback(worst_feedback),
-                "newest_feedback": serialize_feedback(newest_feedback),
-                "longest_feedback": serialize_feedback(longest_feedback),
+    async def get_ratings_by_genre(self) -> dict[str, dict[str, float]]:
+        """Calculate average ratings explicitly by genre."""
+        return (await self._get_rating_stats())["ratings_by_genre"]
+
+    async def _get_average(self, column) -> Optional[float]:
+        async with self.Session() as session:
+            return await session.scalar(select(func.avg(column)))
+
+    async def _get_feedback_extremes(self) -> dict[str, Optional[dict]]:
+        """Find the best, worst, newest and longest feedback with one window query"""
+        ranked = select(
+            BotFeedback.user_id,
+            BotFeedback.rating,
+            BotFeedback.message,
+            BotFeedback.created_at,
+            func.row_number().over(
+                order_by=(BotFeedback.rating.desc(), BotFeedback.created_at.asc())
+            ).label("best"),
+            func.row_number().over(
+                order_by=(BotFeedback.rating.asc(), BotFeedback.created_at.asc())
+            ).label("worst"),
+            func.row_number().over(
+                order_by=BotFeedback.created_at.desc()
+            ).label("newest"),
+            func.row_number().over(
+                partition_by=BotFeedback.message.is_(None),
+                order_by=func.length(BotFeedback.message).desc()
+            ).label("longest"),
+        ).subquery()
+
+        async with self.Session() as session:
+            rows = (await session.execute(
+                select(ranked).where(or_(
+                    ranked.c.best == 1,
+                    ranked.c.worst == 1,
+                    ranked.c.newest == 1,
+                    and_(ranked.c.longest == 1, ranked.c.message.isnot(None))
+                ))
+            )).all()
+
+        extremes = dict.fromkeys(("best", "worst", "newest", "longest"))
+        for user_id, rating, message, created_at, best, worst, newest, longest in rows:
+            feedback = {
+                "user_id": user_id,
+                "rating": rating,
+                "message": message,
+                "created_at": created_at
             }
+            if best == 1:
+                extremes["best"] = feedback
+            if worst == 1:
+                extremes["worst"] = feedback
+            if newest == 1:
+                extremes["newest"] = feedback
+            if longest == 1 and message is not None:
+                extremes["longest"] = feedback
+        return extremes
+
+    async def get_feedback_summary(self, rating_stats: Optional[dict] = None) -> dict[str, Optional[dict]]:
+        """
+        Summarize bot feedback and generation ratings.
+        Pass `rating_stats` from `_get_rating_stats` to reuse already computed aggregates.
+        """
+        # Independent reads, each in its own session: WAL lets them run concurrently
+        queries = [
+            self._get_average(BotFeedback.rating),
+            self._get_average(GenerationRating.rating),
+            self._get_feedback_extremes(),
+        ]
+        if rating_stats is None:
+            queries.append(self._get_rating_stats())
+        avg_rating, avg_generation_rating, extremes, *computed_stats = await asyncio.gather(*queries)
+        if computed_stats:
+            rating_stats = computed_stats[0]
+
+        return {
+            "average_rating": round(avg_rating, 2) if avg_rating else None,
+            "avg_gen_rating":
+                round(avg_generation_rating, 2) if avg_generation_rating else None,
+            "avg_gen_rating_by_model": rating_stats["avg_rating_by_model"],
+            "best_feedback": extremes["best"],
+            "worst_feedback": extremes["worst"],
+            "newest_feedback": extremes["newest"],
+            "longest_feedback": extremes["longest"],
+        }
+
+    async def get_bot_feedback_export(self) -> dict:
+        """Collect feedback summary, generation rating stats and all feedback entries for export."""
+        rating_stats = await self._get_rating_stats()
+        summary = await self.get_feedback_summary(rating_stats)
+
+        async with self.Session() as session:
+            bot_feedback_entries = await session.stream_scalars(
+                select(BotFeedback)
+                .order_by(BotFeedback.created_at.asc())
+                .execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
 
-    def export_bot_feedback_json(self) -> str:
-        """Export all feedback entries explicitly to JSON."""
-        with self.Session() as session:
-            bot_feedback_entries = session.query(BotFeedback).order_by(BotFeedback.created_at.asc()).all()
-            summary = self.get_feedback_summary()
-
-            feedback_data = {
+            return {
                 "summary": summary,
                 "generations": {
                     "avg_rating": summary["avg_gen_rating"],
                     "avg_rating_by_model": summary["avg_gen_rating_by_model"],
-                    "rating_distribution": self.get_generation_rating_distribution(),
-                    "rating_distibution_by_model": self.get_generation_rating_distribution_by_model(),
-                    "ratings_by_top_emotion": self.get_ratings_by_top_emotion(),
-                    "ratings_by_rhyme_scheme": self.get_ratings_by_rhyme_scheme(),
-                    "ratings_by_genre": self.get_ratings_by_genre(),
+                    "rating_distribution": rating_stats["rating_distribution"],
+                    "rating_distibution_by_model": rating_stats["rating_distribution_by_model"],
+                    "ratings_by_top_emotion": rating_stats["ratings_by_top_emotion"],
+                    "ratings_by_rhyme_scheme": rating_stats["ratings_by_rhyme_scheme"],
+                    "ratings_by_genre": rating_stats["ratings_by_genre"],
                 },
                 "bot": [
                     {
@@ -495,25 +770,34 @@ class Database:
                         "rating": fb.rating,
                         "message": fb.message,
                         "telegram_message_id": fb.telegram_message_id,
-                        "created_at": fb.created_at.isoformat()
+                        "created_at": fb.created_at
                     }
-                    for fb in bot_feedback_entries
+                    async for fb in bot_feedback_entries
                 ]
             }
 
-            return json.dumps(feedback_data, ensure_ascii=False, indent=2)
+    async def export_bot_feedback_json(self) -> str:
+        """Export all feedback entries explicitly to JSON."""
+        return dumps_pretty(await self.get_bot_feedback_export())
+
+    async def check_health(self) -> bool:
+        """Simple database health check, the result is reused for `HEALTH_CHECK_TTL` seconds"""
+        now = time.monotonic()
+        if self._last_health is None or now - self._last_health_checked_at >= HEALTH_CHECK_TTL:
+            self._last_health = await self._probe()
+            self._last_health_checked_at = now
+        return self._last_health
 
-    def check_health(self) -> bool:
-        """Simple database health check"""
+    async def _probe(self) -> bool:
         try:
-            with self.Session() as session:
-                session.execute(text("SELECT 1"))
+            async with self.engine.connect() as connection:
+                await connection.execute(text("SELECT 1"))
                 return True
         except Exception as e:
-            print(f"Database health check failed: {str(e)}")
+            logger.warning(f"Database health check failed: {str(e)}")
             return False
 
-    def rate_emotion_analysis(
+    async def rate_emotion_analysis(
         self,
         user_id: int,
         emotion_analysis_id: int,
@@ -521,34 +805,53 @@ class Database:
         correct_emotion: Optional[str] = None
     ) -> None:
         """Сохраняет оценку анализа эмоций"""
-        with self.Session() as session:
+        async with self.Session() as session:
             session.add(EmotionRating(
                 user_id=user_id,
                 emotion_analysis_id=emotion_analysis_id,
                 is_correct=is_correct,
                 correct_emotion=correct_emotion
             ))
-            session.commit()
+            await session.commit()
 
-    def has_user_rated_emotion(self, user_id: int, emotion_analysis_id: int) -> bool:
+        self._aggregates_cache.clear()
+
+    async def has_user_rated_emotion(self, user_id: int, emotion_analysis_id: int) -> bool:
         """Проверяет, оценивал ли пользователь этот анализ эмоций"""
-        with self.Session() as session:
-            return session.query(EmotionRating).filter_by(
-                user_id=user_id,
-                emotion_analysis_id=emotion_analysis_id
-            ).first() is not None
+        async with self.Session() as session:
+            return await session.scalar(select(exists().where(
+                EmotionRating.user_id == user_id,
+                EmotionRating.emotion_analysis_id == emotion_analysis_id
+            )))
+
+    async def get_rated_emotion_analyses(self) -> list[tuple[EmotionRating, EmotionAnalysis]]:
+        """Возвращает все оценки эмоций вместе с оценёнными анализами"""
+        async with self.Session() as session:
+            rows = await session.stream(
+                select(EmotionRating, EmotionAnalysis).join(
+                    EmotionAnalysis, EmotionRating.emotion_analysis_id == EmotionAnalysis.id
+                ).execution_options(yield_per=EXPORT_BATCH_SIZE)
+            )
+            return [(rating, analysis) async for rating, analysis in rows]
 
-    def get_emotion_rating_stats(self) -> dict:
+    async def get_emotion_rating_stats(self) -> dict:
         """Получает статистику по оценкам эмоций"""
-        with self.Session() as session:
-            total_ratings = session.query(func.count(EmotionRating.id)).scalar()
-            correct_ratings = session.query(func.count(EmotionRating.id)).filter_by(is_correct=True).scalar()
-            
+        return await self._cached("emotion_rating_stats", self._compute_emotion_rating_stats)
+
+    async def _compute_emotion_rating_stats(self) -> dict:
+        async with self.Session() as session:
+            total_ratings = await session.scalar(select(func.count(EmotionRating.id)))
+            correct_ratings = await session.scalar(
+                select(func.count(EmotionRating.id)).where(EmotionRating.is_correct.is_(True))
+            )
+
             # Получаем распределение правильных эмоций
-            correct_emotions = session.query(
-                EmotionRating.correct_emotion,
-                func.count(EmotionRating.id)
-            ).filter_by(is_correct=False).group_by(EmotionRating.correct_emotion).all()
+            correct_emotions = (await session.execute(
+                select(
+                    EmotionRating.correct_emotion,
+                    func.count(EmotionRating.id)
+                ).where(EmotionRating.is_correct.is_(False)).group_by(EmotionRating.correct_emotion)
+            )).all()
 
             return {
                 "total_ratings": total_ratings,
@@ -558,25 +861,38 @@ class Database:
             }
 
 
-# Usage example
-if __name__ == "__main__":
+async def _demo():
     db = Database()
+    await db.create_tables()
 
     # Test data
     user_id = 123456789
-    db.add_user(user_id)
+    await db.add_user(user_id)
 
     # Log emotion analysis
-    db.log_emotion_analysis(user_id, {"happy": 0.8, "sad": 0.1}, "Грустный текст о осени")
+    await db.log_emotion_analysis(user_id, {"happy": 0.8, "sad": 0.1}, "Грустный текст о осени")
 
     # Log generation
-    db.log_generation(
+    await db.log_generation(
         user_id,
         "Грустный текст о осени",
-        "Листья падают, грусть в воздухе..."
+        {"happy": 0.8, "sad": 0.1},
+        "Листья падают, грусть в воздухе...",
+        GenerationModel.RUGPT3.value,
+        "ABAB",
+        "произвольный",
     )
 
     # Get history
-    history = db.get_user_history(user_id)
+    history = await db.get_user_history(user_id)
     print(f"Emotion history: {len(history['emotions'])} entries")
     print(f"Generation history: {len(history['generations'])} entries")
+
+    await db.engine.dispose()
+
+
+# Usage example
+if __name__ == "__main__":
+    import asyncio
+
+    asyncio.run(_demo())
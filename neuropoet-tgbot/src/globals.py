@@ -4,6 +4,7 @@ from .api.emotion_api import EmotionAPI
 from .api.poetry_api import PoetryAPI
 from .database.database import Database
 import aiohttp
+import asyncio
 
 
 class GlobalState:
@@ -11,30 +12,40 @@ class GlobalState:
         self._emotion_api = None
         self._poetry_api = None
         self._database = None
+        self._database_lock = asyncio.Lock()
         self._session = None
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Both APIs share one HTTP session, so close() releases every connection
+        if not self._session:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
     async def get_emotion_api(self) -> EmotionAPI:
         if not self._emotion_api:
-            self._session = aiohttp.ClientSession()
-            self._emotion_api = EmotionAPI(self._session)
+            self._emotion_api = EmotionAPI(self._get_session())
         return self._emotion_api
 
     async def get_poetry_api(self) -> PoetryAPI:
         if not self._poetry_api:
-            self._session = aiohttp.ClientSession()
-            self._poetry_api = PoetryAPI(self._session)
+            self._poetry_api = PoetryAPI(self._get_session())
         return self._poetry_api
 
     async def get_database(self) -> Database:
         if not self._database:
-            self._database = Database()
+            # Concurrent first updates must not build separate engines while tables are being created
+            async with self._database_lock:
+                if not self._database:
+                    database = Database()
+                    await database.create_tables()
+                    self._database = database
         return self._database
 
     async def close(self):
         if self._session:
             await self._session.close()
         if self._database:
-            self._database.engine.dispose()
+            await self._database.engine.dispose()
 
 
 @lru_cache(maxsize=None)
@@ -3,6 +3,10 @@ from dataclasses import dataclass
 from typing import Type, Any
 
 
+VARIATION_SELECTOR_16 = '\ufe0f'
+_TRIE_MEMBER = None  # Trie node key holding the member that ends at this node
+
+
 @dataclass(frozen=True)
 class EmojiEntry:
     emoji: str
@@ -16,12 +20,32 @@ class EmojiTypeMeta(type(Enum)):
         # Create the enum class
         enum_cls = super().__new__(cls, clsname, bases, namespace)
 
-        # Validate all member values
+        # Validate all member values, skipped under `python -O`
+        if __debug__:
+            for member in enum_cls:
+                if not isinstance(member.value, EmojiEntry):
+                    raise TypeError(
+                        f"Enum member {member.name} must have EmojiEntry instance as value"
+                    )
+
+        # Cache the emoji string on every member and build a reverse index for from_emoji
+        for member in enum_cls:
+            member._emoji_str = member.value.emoji
+        enum_cls._by_emoji = {member._emoji_str: member for member in enum_cls}
+
+        # Members usable as Telegram message reactions, in definition order
+        enum_cls.REACTION_SUPPORTED = tuple(member for member in enum_cls if member.value.reaction_supported)
+        enum_cls.REACTION_EMOJI_STRINGS = tuple(member._emoji_str for member in enum_cls.REACTION_SUPPORTED)
+
+        # Prefix trie for match_prefix, every emoji is also reachable without its VS-16 selectors
+        trie = {}
         for member in enum_cls:
-            if not isinstance(member.value, EmojiEntry):
-                raise TypeError(
-                    f"Enum member {member.name} must have EmojiEntry instance as value"
-                )
+            for key in {member._emoji_str, member._emoji_str.replace(VARIATION_SELECTOR_16, '')}:
+                node = trie
+                for char in key:
+                    node = node.setdefault(char, {})
+                node[_TRIE_MEMBER] = member
+        enum_cls._trie = trie
         return enum_cls
 
 
@@ -45,12 +69,32 @@ class Emoji(Enum, metaclass=EmojiTypeMeta):
     @property
     def emoji(self) -> str:
         """Direct access to emoji string"""
-        return self.value.emoji
+        return self._emoji_str
 
     @classmethod
     def from_emoji(cls, emoji_str: str) -> 'Emoji':
         """Get enum member by emoji string"""
-        for member in cls:
-            if member.value.emoji == emoji_str:
-                return member
-        raise ValueError(f"No Emoji found for '{emoji_str}'")
\ No newline at end of file
+        try:
+            return cls._by_emoji[emoji_str]
+        except KeyError:
+            # Clients may send an emoji without its VS-16 selector, e.g. "⚠" for "⚠️"
+            match = cls.match_prefix(emoji_str)
+            if match is not None and match[1] == len(emoji_str):
+                return match[0]
+            raise ValueError(f"No Emoji found for '{emoji_str}'") from None
+
+    @classmethod
+    def match_prefix(cls, s: str, start: int = 0) -> tuple['Emoji', int] | None:
+        """
+        Find the longest emoji starting at `start` in `s` with a single left-to-right scan.
+        Returns the member and the index right after the matched emoji, or None if there is no match.
+        """
+        node = cls._trie
+        match = None
+        for index in range(start, len(s)):
+            node = node.get(s[index])
+            if node is None:
+                break
+            if _TRIE_MEMBER in node:
+                match = node[_TRIE_MEMBER], index + 1
+        return match
\ No newline at end of file
@@ -1,3 +1,7 @@
+import heapq
+from functools import lru_cache
+from operator import itemgetter
+
 EMOTION_TRANSLATIONS = {
     "happy": "радость",
     "joy": "радость",
@@ -16,25 +20,45 @@ def translate_emotion(emotion):
     return EMOTION_TRANSLATIONS.get(emotion, emotion)
 
 
+def top_emotion(emotion_dict: dict[str, float]) -> tuple[str, float] | None:
+    """
+    Returns the (emotion, score) pair with the highest score, or None if the dict is empty.
+    Both max and index run over a plain list of scores, without a per-item key function.
+    """
+    if not emotion_dict:
+        return None
+
+    scores = list(emotion_dict.values())
+    best_score = max(scores)
+    return list(emotion_dict)[scores.index(best_score)], best_score
+
+
 def top_emotions_translated(emotion_dict: dict[str, float], limit: int | None = None) -> list[str]:
     """
     Returns top emotions translated into Russian, formatted as "emotion (percentage%)".
     Sorted by descending percentage.
     If limit is provided, returns only the top N emotions.
     """
-    sorted_emotions = sorted(
-        emotion_dict.items(),
-        key=lambda item: item[1],
-        reverse=True
-    )
+    # Items keep the dict order, so ties are resolved the same way on cache hits
+    return list(_top_emotions_translated(tuple(emotion_dict.items()), limit))
 
-    if limit is not None:
-        sorted_emotions = sorted_emotions[:limit]
 
-    return [
-        f"{translate_emotion(emotion)} ({percentage * 100:.1f}%)"
+@lru_cache(maxsize=256)
+def _top_emotions_translated(
+        emotion_items: tuple[tuple[str, float], ...],
+        limit: int | None
+) -> tuple[str, ...]:
+    if limit is None:
+        sorted_emotions = sorted(emotion_items, key=itemgetter(1), reverse=True)
+    else:
+        # Only the top few are needed, so skip sorting the rest
+        sorted_emotions = heapq.nlargest(limit, emotion_items, key=itemgetter(1))
+
+    translate = EMOTION_TRANSLATIONS.get  # Local alias, looked up once instead of per emotion
+    return tuple(
+        f"{translate(emotion, emotion)} ({percentage * 100:.1f}%)"
         for emotion, percentage in sorted_emotions
-    ]
+    )
 
 
 if __name__ == "__main__":
@@ -1,3 +1,25 @@
+import re
+from functools import lru_cache
+
+# All special characters for MarkdownV2 per Telegram docs
+_ESCAPE_CHARS = frozenset('_*[]()~`>#+-=|{}.!\\')
+
+# Built from _ESCAPE_CHARS, so the character set is defined in one place
+_MDV2_RE = re.compile(f"[{''.join(map(re.escape, sorted(_ESCAPE_CHARS)))}]")
+
+# Only short texts (labels, names, numbers) repeat often enough to be worth caching
+_CACHED_TEXT_MAX_LENGTH = 64
+
+
+def _escape(text: str) -> str:
+    # One C-level pass that both finds and escapes the characters;
+    # a text with nothing to escape comes back as the same object
+    return _MDV2_RE.sub(r"\\\g<0>", text)
+
+
+_escape_cached = lru_cache(maxsize=1024)(_escape)
+
+
 def escape_markdown(text: str) -> str:
     """
     Escapes special characters for Telegram's MarkdownV2 syntax.
@@ -6,10 +28,6 @@ def escape_markdown(text: str) -> str:
     if text is None:
         return ""
 
-    # All special characters for MarkdownV2 per Telegram docs
-    escape_chars = {'_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!', '\\'}
-
-    return ''.join(
-        f'\\{char}' if char in escape_chars else char
-        for char in text
-    )
\ No newline at end of file
+    if len(text) <= _CACHED_TEXT_MAX_LENGTH:
+        return _escape_cached(text)
+    return _escape(text)
\ No newline at end of file
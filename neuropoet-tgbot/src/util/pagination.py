@@ -0,0 +1,44 @@
+import base64
+import binascii
+import struct
+from datetime import datetime, timedelta
+
+_EPOCH = datetime(1970, 1, 1)
+_CURSOR_FORMAT = ">qq"
+
+
+def _to_micros(dt: datetime | None) -> int:
+    return 0 if dt is None else (dt - _EPOCH) // timedelta(microseconds=1)
+
+
+def encode_history_cursor(
+        before_emotions: datetime | None,
+        before_generations: datetime | None
+) -> str:
+    """
+    Packs the `performed_at` of the last shown emotion analysis and generation
+    into a compact URL-safe string, small enough to fit into callback data.
+
+    None marks an exhausted list: it is encoded as the epoch, so the next page
+    query for that list returns nothing.
+    """
+    packed = struct.pack(_CURSOR_FORMAT, _to_micros(before_emotions), _to_micros(before_generations))
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode("ascii")
+
+
+def decode_history_cursor(cursor: str) -> tuple[datetime, datetime]:
+    """
+    Reverses `encode_history_cursor`.
+
+    :raises ValueError: if the cursor is malformed.
+    """
+    try:
+        packed = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        emotions_micros, generations_micros = struct.unpack(_CURSOR_FORMAT, packed)
+    except (binascii.Error, struct.error) as e:
+        raise ValueError(f"Invalid history cursor '{cursor}'") from e
+
+    return (
+        _EPOCH + timedelta(microseconds=emotions_micros),
+        _EPOCH + timedelta(microseconds=generations_micros),
+    )
@@ -0,0 +1,26 @@
+import json
+from datetime import date
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # orjson is optional: fall back to the stdlib encoder
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # Mirrors orjson, which writes dates and datetimes in ISO 8601 on its own
+    if isinstance(obj, date):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_pretty(obj: Any) -> str:
+    """
+    Serializes an object to JSON indented with 2 spaces, keeping non-ASCII characters as is.
+    Dates and datetimes are written in ISO 8601.
+    Uses orjson when available, which is several times faster than the stdlib encoder.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, ensure_ascii=False, indent=2, default=_default)
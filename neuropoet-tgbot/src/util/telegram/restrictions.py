@@ -2,41 +2,48 @@ import os
 from typing import Callable, Any, Coroutine
 from aiogram import types
 from aiogram.dispatcher import dispatcher
-from functools import wraps
+from functools import wraps, lru_cache
 from dotenv import load_dotenv
 
 
-def get_owner_ids() -> list[int]:
+@lru_cache(maxsize=1)
+def get_owner_ids() -> frozenset[int]:
     '''
-    Obtains a list of bot owners, parsed from the env_variable `NPB_OWNER_USER_IDS`,
+    Obtains a set of bot owners, parsed from the env_variable `NPB_OWNER_USER_IDS`,
 
     Expects the env variable to be a list of integers, separated by comma wihout spaces, e.g.
 
     `NPB_OWNER_USER_IDS=123456789,123456790`
-    :return: List of bot owner IDs, or an empty list if unable to parse the variable.
+
+    The variable is parsed once and cached, call `get_owner_ids.cache_clear()` after changing it.
+    :return: Set of bot owner IDs, or an empty set if unable to parse the variable.
     '''
     owner_ids_line = os.getenv('NPB_OWNER_USER_IDS', '').strip()
     if not owner_ids_line:
-        return []
+        return frozenset()
 
-    return [
+    return frozenset(
         int(clean_id)
         for owner_id in owner_ids_line.split(',')
         if (clean_id := owner_id.strip()).isdigit()
-    ]
+    )
 
 
 def owner_only_command(
         default_action: Callable[[types.Message], Coroutine[Any, Any, None]],
-        owner_ids_provider: Callable[[], list[int]] = get_owner_ids
+        owner_ids_provider: Callable[[], frozenset[int]] = get_owner_ids,
+        static: bool = True
 ) -> Callable:
     """
     Decorator that restricts command access to bot owners only.
 
     Args:
         default_action: Async function to execute for non-owner users
-        owner_ids_provider: Function that returns list of owner IDs
+        owner_ids_provider: Function that returns a set of owner IDs
                            (default: get_owner_ids)
+        static: Call the provider only once, on the first message, and reuse its result.
+                The first call happens after startup, so the env is already loaded.
+                Pass False to ask the provider on every message.
 
     Returns:
         Command handler wrapped with ownership check
@@ -49,10 +56,17 @@ def owner_only_command(
     """
 
     def decorator(handler: Callable[[types.Message], Coroutine[Any, Any, None]]):
+        static_ids: frozenset[int] | None = None
+
         @wraps(handler)
         async def wrapped(message: types.Message, *args, **kwargs):
-            # Get fresh list of owner IDs on each call
-            authorized_ids = owner_ids_provider()
+            nonlocal static_ids
+            if not static:
+                authorized_ids = owner_ids_provider()
+            else:
+                if static_ids is None:
+                    static_ids = owner_ids_provider()
+                authorized_ids = static_ids
 
             if message.from_user.id in authorized_ids:
                 return await handler(message, *args, **kwargs)
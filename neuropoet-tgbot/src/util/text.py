@@ -16,20 +16,61 @@ def truncate_text(
     Returns:
         str: Truncated text with ellipsis if needed.
     """
-    lines = s.splitlines()
-    truncated = False
+    # Common case: the text already fits, return it as is without building a new string
+    if (
+            not s.endswith("\n")
+            and (total_limit is None or len(s) <= total_limit)
+            and (vert_limit is None or s.count("\n") < vert_limit)
+    ):
+        return s
 
-    if vert_limit is not None and len(lines) > vert_limit:
-        lines = lines[:vert_limit]
-        truncated = True
+    # Like splitlines, a single trailing line break doesn't start a new line
+    result = s[:-1] if s.endswith("\n") else s
+    truncated = False
 
-    result = "\n".join(lines)
+    if vert_limit is not None and s:
+        # Find where the line after the first vert_limit lines starts, without splitting the whole text
+        next_line_start = 0
+        for _ in range(vert_limit):
+            line_end = result.find("\n", next_line_start)
+            if line_end == -1:
+                break
+            next_line_start = line_end + 1
+        else:
+            result = result[:max(next_line_start - 1, 0)]
+            truncated = True
 
     if total_limit is not None and len(result) > total_limit:
-        result = result[:total_limit].rstrip()
+        # Skip trailing whitespace before slicing, so only one new string is built
+        end = total_limit
+        while end > 0 and result[end - 1].isspace():
+            end -= 1
+        result = result[:end]
         truncated = True
 
     if truncated:
         result += ellipsis
 
     return result
+
+
+def get_command_args(s: str) -> str:
+    """
+    Returns the arguments of a bot command message, i.e. everything after the command itself, stripped.
+
+    Uses `str.partition` instead of splitting, so no throwaway word list is allocated.
+
+    Parameters:
+        s (str): Message text, e.g. "/generate текст".
+
+    Returns:
+        str: Command arguments, or an empty string if there are none.
+    """
+    head, sep, tail = s.partition(' ')
+
+    # Arguments may also start on the next line, e.g. "/generate\nтекст"
+    _, newline, rest = head.partition('\n')
+    if newline:
+        tail = rest + sep + tail
+
+    return tail.strip()